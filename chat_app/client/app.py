@@ -1,29 +1,113 @@
 """Main client application."""
 
+import asyncio
+import os
 import socket
-import threading
+import sys
 import time
-from typing import Optional, Dict
+import zlib
+from functools import lru_cache
+from typing import Optional, Dict, Tuple
 
 from textual import on
 from textual.app import App
 from textual.containers import Container
 from textual.widgets import Input, RichLog
 
+from rich.color import ColorParseError
+from rich.style import Style
 from rich.text import Text
 
 from .ui.styles import CLIENT_CSS
 from .ui.widgets import HeaderText
 from ..common.constants import (
-    PROTOCOL_NICK, PROTOCOL_SERVER_FULL,
-    SELF_COLOR, COLOR_TIMESTAMP, COLOR_SYSTEM,
+    PROTOCOL_NICK, PROTOCOL_SERVER_FULL_BYTES, PROTOCOL_USERNAME_TAKEN,
+    PROTOCOL_CONNECTED, SHUTDOWN_MESSAGE,
+    USER_COLORS, SELF_COLOR, COLOR_TIMESTAMP, COLOR_SYSTEM,
     COLOR_HELP, COLOR_ERROR, COLOR_PRIVATE,
-    COLOR_DEFAULT, SOCKET_TIMEOUT, CONNECT_TIMEOUT,
-    BUFFER_SIZE
+    CONNECT_TIMEOUT, SOCKET_BUFFER_SIZE
+)
+from ..common.protocols import (
+    parse_server_message, clear_parse_cache, encode_frame, read_frame,
+    format_system_message
 )
-from ..common.protocols import parse_server_message
 from ..common.utils import get_timestamp
 
+# Control payloads, compared as raw bytes before anything is decoded
+_NICK_B = PROTOCOL_NICK.encode('utf-8')
+_USERNAME_TAKEN_B = PROTOCOL_USERNAME_TAKEN.encode('utf-8')
+_CONNECTED_B = PROTOCOL_CONNECTED.encode('utf-8')
+_SHUTDOWN_B = format_system_message(SHUTDOWN_MESSAGE).encode('utf-8')
+
+# Join/leave notice suffixes sent by the server
+_JOIN_SUFFIX = " joined the chat!"
+_LEAVE_SUFFIX = " left the chat"
+
+# Set CHAT_DEBUG=1 to mirror every log line to stderr
+_DEBUG = bool(os.environ.get("CHAT_DEBUG"))
+
+# Client help banner, rendered once. Lines after the first are indented by
+# the width of the "[HH:MM:SS] " prefix so the box stays aligned under it.
+_HELP_TEXT = """
+╔══════════════════════════════════════════╗
+║            GROUP CHAT HELP               ║
+╠══════════════════════════════════════════╣
+║ Commands:                                ║
+║   /help         - Show this message      ║
+║   /w user msg   - Whisper (private)      ║
+║                                          ║
+║ Navigation Shortcuts:                    ║
+║   Ctrl+Q    - Quit application           ║
+║   F1        - Show this help             ║
+║   Up        - Scroll up                  ║
+║   Down      - Scroll down                ║
+║   Page Up   - Scroll page up             ║
+║   Page Down - Scroll page down           ║
+║   Home      - Go to top of chat          ║
+║   End       - Go to bottom of chat       ║
+║   Tab       - Focus next widget          ║
+║   Shift+Tab - Focus previous widget      ║
+║                                          ║
+║ Chat Features:                           ║
+║   • Your messages appear in blue         ║
+║   • Others have unique colors            ║
+║   • System messages are in yellow        ║
+║   • Help messages are in cyan            ║
+║   • Error messages are in red            ║
+║   • Whispers in gray: [You ⭢ User]: msg  ║
+║   • Only sender/receiver see whispers    ║
+║   • Type normally for group chat         ║
+╚══════════════════════════════════════════╝
+"""
+_HELP_PREFIX_WIDTH = len("[00:00:00] ")
+_HELP_RENDERED = Text(
+    ("\n" + " " * _HELP_PREFIX_WIDTH).join(_HELP_TEXT.strip().split("\n")),
+    style=COLOR_HELP
+)
+
+
+# Parsed bold username styles keyed by hex color
+_STYLE_CACHE: Dict[str, Style] = {}
+
+
+def _username_style(color: str) -> Style:
+    """Get the bold username style for a color, parsing it only once."""
+    style = _STYLE_CACHE.get(color)
+    if style is None:
+        try:
+            style = Style(color=color, bold=True)
+        except ColorParseError:
+            # Color came off the wire; a bad one must not drop the connection
+            style = Style(bold=True)
+        _STYLE_CACHE[color] = style
+    return style
+
+
+@lru_cache(maxsize=256)
+def _ts_prefix(timestamp: str, style: str = COLOR_TIMESTAMP) -> Text:
+    """Build the "[HH:MM:SS] " prefix once per timestamp/style pair."""
+    return Text(f"[{timestamp}] ", style=style)
+
 
 class ChatClient(App):
     """Group Chat client with TUI interface."""
@@ -46,12 +130,28 @@ class ChatClient(App):
                  preconnected_socket: socket.socket = None):
         super().__init__()
         self.nickname = nickname
+        self._nick_frame = encode_frame(nickname)  # Sent as-is in the handshake
         self.server_host = server_host
         self.server_port = server_port
-        self.client = preconnected_socket is not None
-        self.client: Optional[socket.socket] = None
-        self.connected = False
+        # A preconnected socket has already completed the NICK handshake
+        self.client: Optional[socket.socket] = preconnected_socket
+        self.connected = preconnected_socket is not None
+        # Streams over self.client, driven by Textual's event loop
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
         self.user_colors: Dict[str, str] = {}
+        # Bound once for the per-message color lookup
+        self._self_nick = nickname
+        self._user_colors_get = self.user_colors.get
+        # Rendered "[SYSTEM] X joined/left" bodies keyed by (display_name, event)
+        self._presence_lines: Dict[Tuple[str, str], Text] = {}
+        # message_type -> formatter for the (timestamp, message) types
+        self._formatters = {
+            "error": self.format_error_message,
+            "info": self.format_info_message,
+            "help": self.format_help_message,
+            "system": self.format_system_message,
+        }
 
     def compose(self):
         yield HeaderText(self.nickname, self.server_host, self.server_port)
@@ -69,16 +169,19 @@ class ChatClient(App):
     def on_mount(self):
         """When the application mounts."""
         self.title = f"Group Chat - {self.nickname}"
-        self.query_one("#message_input").focus()
+        # Cache widget references instead of walking the DOM on every line/key
+        self._messages = self.query_one("#messages", RichLog)
+        self._input = self.query_one("#message_input", Input)
+        self._input.focus()
 
         if self.connected:
             self.add_message("Connection established successfully", "info")
-            # Start receiving messages
-            threading.Thread(target=self.receive_messages, daemon=True).start()
         else:
             self.add_message(f"Connecting to {self.server_host}:{self.server_port}...", "info")
-            # Start connection in separate thread
-            threading.Thread(target=self.connect_to_server, daemon=True).start()
+
+        # Network I/O runs as a worker on Textual's own event loop, so
+        # received messages reach the log without a thread hop
+        self.run_worker(self._run_connection(), exclusive=True)
 
     def get_user_display_name(self, username: str) -> str:
         """Get the display name for a user."""
@@ -88,35 +191,47 @@ class ChatClient(App):
 
     def get_user_color(self, username: str, message_color: str = None) -> str:
         """Get color for a user, using cache or message color."""
-        if username == self.nickname:
+        if username == self._self_nick:
             return SELF_COLOR
 
         if message_color:
             self.user_colors[username] = message_color
             return message_color
 
-        return self.user_colors.get(username, COLOR_DEFAULT)
+        color = self._user_colors_get(username)
+        if color is None:
+            # First sighting without a color: pick a stable one and remember it
+            color = USER_COLORS[zlib.crc32(username.encode('utf-8')) % len(USER_COLORS)]
+            self.user_colors[username] = color
+        return color
 
     def format_user_message(self, timestamp: str, username: str,
                            message: str, user_color: str = None) -> Text:
         """Format a user message with colors and bold username."""
-        timestamp_text = Text(f"[{timestamp}] ", style=COLOR_TIMESTAMP)
-
         display_name = self.get_user_display_name(username)
         color = self.get_user_color(username, user_color)
 
-        username_text = Text(f"{display_name}: ", style=color)
-        username_text.stylize("bold")
-
-        message_text = Text(message, style="#ffffff")
-
-        return timestamp_text + username_text + message_text
+        return Text.assemble(
+            _ts_prefix(timestamp),
+            (f"{display_name}: ", _username_style(color)),
+            (message, "#ffffff")
+        )
 
     def format_system_message(self, timestamp: str, message: str) -> Text:
         """Format a system message."""
-        timestamp_text = Text(f"[{timestamp}] ", style=COLOR_TIMESTAMP)
-        message_text = Text(message, style=COLOR_SYSTEM)
-        return timestamp_text + message_text
+        return Text.assemble(_ts_prefix(timestamp), (message, COLOR_SYSTEM))
+
+    def get_presence_line(self, display_name: str, event: str) -> Text:
+        """Get the cached join/leave system line for a user."""
+        key = (display_name, event)
+        line = self._presence_lines.get(key)
+        if line is None:
+            if event == "join":
+                line = Text(f"[SYSTEM] {display_name} joined the chat!", style=COLOR_SYSTEM)
+            else:
+                line = Text(f"[SYSTEM] {display_name} left the chat", style=COLOR_SYSTEM)
+            self._presence_lines[key] = line
+        return line
 
     def format_info_message(self, timestamp: str, message: str) -> Text:
         """Format an info message."""
@@ -124,15 +239,11 @@ class ChatClient(App):
 
     def format_error_message(self, timestamp: str, message: str) -> Text:
         """Format an error message."""
-        timestamp_text = Text(f"[{timestamp}] ", style=COLOR_TIMESTAMP)
-        message_text = Text(message, style=COLOR_ERROR)
-        return timestamp_text + message_text
+        return Text.assemble(_ts_prefix(timestamp), (message, COLOR_ERROR))
 
     def format_help_message(self, timestamp: str, message: str) -> Text:
         """Format a help message."""
-        timestamp_text = Text(f"[{timestamp}] ", style=COLOR_TIMESTAMP)
-        message_text = Text(message, style=COLOR_HELP)
-        return timestamp_text + message_text
+        return Text.assemble(_ts_prefix(timestamp), (message, COLOR_HELP))
 
     def format_private_message(self, timestamp: str, message: str) -> Text:
         """Format a private message."""
@@ -147,150 +258,118 @@ class ChatClient(App):
         timestamp = get_timestamp()
 
         # Determine format based on message type
-        if message_type == "error":
-            formatted_text = self.format_error_message(timestamp, message)
-        elif message_type == "info":
-            formatted_text = self.format_info_message(timestamp, message)
-        elif message_type == "help":
-            formatted_text = self.format_help_message(timestamp, message)
+        formatter = self._formatters.get(message_type)
+        if formatter:
+            formatted_text = formatter(timestamp, message)
         elif message_type == "sent":
             formatted_text = self.format_user_message(timestamp, self.nickname,
                                                       message, SELF_COLOR)
         elif message_type == "received":
             parsed = parse_server_message(message)
 
-            if parsed["is_system"]:
+            if parsed.is_system:
                 # Handle system messages with special "You" treatment for join/leave
-                content = parsed["content"]
+                content = parsed.content
 
                 # Check if this is a join/leave message for the current user
-                if content.endswith("joined the chat!"):
-                    username = content.replace(" joined the chat!", "")
+                if content.endswith(_JOIN_SUFFIX):
+                    username = content[:-len(_JOIN_SUFFIX)]
                     display_name = self.get_user_display_name(username)
-                    formatted_text = self.format_system_message(
-                        timestamp, f"[SYSTEM] {display_name} joined the chat!"
-                    )
-                elif content.endswith(" left the chat"):
-                    username = content.replace(" left the chat", "")
+                    formatted_text = _ts_prefix(timestamp) + self.get_presence_line(display_name, "join")
+                elif content.endswith(_LEAVE_SUFFIX):
+                    username = content[:-len(_LEAVE_SUFFIX)]
                     display_name = self.get_user_display_name(username)
-                    formatted_text = self.format_system_message(
-                        timestamp, f"[SYSTEM] {display_name} left the chat"
-                    )
+                    formatted_text = _ts_prefix(timestamp) + self.get_presence_line(display_name, "leave")
                 else:
                     formatted_text = self.format_system_message(timestamp, f"[SYSTEM] {content}")
 
-            elif parsed["is_private"]:
-                formatted_text = self.format_private_message(timestamp, parsed["content"])
+            elif parsed.is_private:
+                formatted_text = self.format_private_message(timestamp, parsed.content)
 
-            elif parsed["username"]:
+            elif parsed.username:
                 # Regular user message
-                username = parsed["username"]
-                actual_message = parsed["content"].split(": ", 1)[1] if ": " in parsed["content"] else parsed["content"]
+                username = parsed.username
+                head, sep, tail = parsed.content.partition(": ")
+                actual_message = tail if sep else head
                 formatted_text = self.format_user_message(timestamp, username,
                                                           actual_message,
-                                                          parsed["user_color"])
+                                                          parsed.user_color)
             else:
                 formatted_text = Text(f"[{timestamp}] {message}", style="#ffffff")
 
-        elif message_type == "system":
-            formatted_text = self.format_system_message(timestamp, message)
         else:
             formatted_text = Text(f"[{timestamp}] {message}", style="#ffffff")
 
-        # Update from main thread or secondary thread
-        messages_widget = self.query_one("#messages")
-
-        if threading.current_thread() == threading.main_thread():
-            messages_widget.write(formatted_text)
-        else:
-            self.call_from_thread(messages_widget.write, formatted_text)
+        # Everything runs on the UI loop, so write straight to the log
+        self._messages.write(formatted_text)
 
-        print(f"CLIENT: [{timestamp}] {message}")
+        if _DEBUG:
+            sys.stderr.write(f"CLIENT: [{timestamp}] {message}\n")
 
     def show_client_help(self):
         """Show help message to client."""
-        help_text = """
-╔══════════════════════════════════════════╗
-║            GROUP CHAT HELP               ║
-╠══════════════════════════════════════════╣
-║ Commands:                                ║
-║   /help         - Show this message      ║
-║   /w user msg   - Whisper (private)      ║
-║                                          ║
-║ Navigation Shortcuts:                    ║
-║   Ctrl+Q    - Quit application           ║
-║   F1        - Show this help             ║
-║   Up        - Scroll up                  ║
-║   Down      - Scroll down                ║
-║   Page Up   - Scroll page up             ║
-║   Page Down - Scroll page down           ║
-║   Home      - Go to top of chat          ║
-║   End       - Go to bottom of chat       ║
-║   Tab       - Focus next widget          ║
-║   Shift+Tab - Focus previous widget      ║
-║                                          ║
-║ Chat Features:                           ║
-║   • Your messages appear in blue         ║
-║   • Others have unique colors            ║
-║   • System messages are in yellow        ║
-║   • Help messages are in cyan            ║
-║   • Error messages are in red            ║
-║   • Whispers in gray: [You ⭢ User]: msg  ║
-║   • Only sender/receiver see whispers    ║
-║   • Type normally for group chat         ║
-╚══════════════════════════════════════════╝
-"""
-        lines = help_text.strip().split('\n')
-        for line in lines:
-            self.add_message(line, "help")
-
-    def handle_client_command(self, message: str) -> bool:
-        """Handle client-side commands."""
-        message = message.strip()
-
-        if message.startswith('/'):
-            parts = message.split(maxsplit=1)
-            command = parts[0].lower()
+        timestamp_text = _ts_prefix(get_timestamp())
+        self._messages.write(timestamp_text + _HELP_RENDERED)
 
-            if command == "/help":
-                self.show_client_help()
-                return True
+    async def _run_connection(self):
+        """Connect (unless already connected), then receive until closed."""
+        if self.connected:
+            try:
+                self._reader, self._writer = await asyncio.open_connection(sock=self.client)
+            except Exception as e:
+                self.add_message(f"Connection error: {e}", "error")
+                self.add_message("Press Ctrl+Q to exit", "info")
+                self.connected = False
+                self.close_connection()
+                return
+        elif not await self.connect_to_server():
+            return
 
-        return False
+        await self.receive_messages()
 
-    def connect_to_server(self):
-        """Connect to the server."""
+    async def connect_to_server(self) -> bool:
+        """Connect to the server. Returns True once the handshake succeeds."""
+        loop = asyncio.get_running_loop()
         try:
             self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client.settimeout(CONNECT_TIMEOUT)
-            self.client.connect((self.server_host, self.server_port))
-            self.client.settimeout(None)
+            # Chat messages are tiny: don't let Nagle hold them back. Buffer
+            # sizes are set before connect() so the window scale covers them.
+            self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+            self.client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+            self.client.setblocking(False)
+            await asyncio.wait_for(
+                loop.sock_connect(self.client, (self.server_host, self.server_port)),
+                CONNECT_TIMEOUT
+            )
+            self._reader, self._writer = await asyncio.open_connection(sock=self.client)
             self.connected = True
 
             # NICK protocol
-            message = self.client.recv(BUFFER_SIZE).decode('utf-8')
+            message = await read_frame(self._reader)
 
-            if message == PROTOCOL_NICK:
-                self.client.send(self.nickname.encode('utf-8'))
+            if message == _NICK_B:
+                self._writer.write(self._nick_frame)
 
                 # Wait for response
-                response = self.client.recv(BUFFER_SIZE).decode('utf-8')
+                response = await read_frame(self._reader) or b""
 
-                if response.startswith("USERNAME_TAKEN"):
+                if response.startswith(_USERNAME_TAKEN_B):
                     # Username already taken - show error but don't exit automatically
-                    error_msg = response.split('|', 1)[1] if '|' in response else "Username already taken"
+                    _, sep, reason = response.decode('utf-8').partition('|')
+                    error_msg = reason if sep else "Username already taken"
                     self.add_message(f"ERROR: {error_msg}", "error")
                     self.add_message("Press Ctrl+Q to exit", "info")
                     self.connected = False
 
-                elif response == "CONNECTED":
+                elif response == _CONNECTED_B:
                     self.add_message("Connection established successfully", "info")
-                    self.receive_messages()
+                    return True
                 else:
                     self.add_message(f"Error: Unexpected response from server", "error")
                     self.connected = False
 
-            elif message == PROTOCOL_SERVER_FULL:
+            elif message == PROTOCOL_SERVER_FULL_BYTES:
                 self.add_message("ERROR: Server is full. Try again later.", "error")
                 self.add_message("Press Ctrl+Q to exit", "info")
                 self.connected = False
@@ -299,7 +378,7 @@ class ChatClient(App):
                 self.add_message("Press Ctrl+Q to exit", "info")
                 self.connected = False
 
-        except socket.timeout:
+        except asyncio.TimeoutError:
             self.add_message(f"ERROR: Connection timeout to {self.server_host}:{self.server_port}", "error")
             self.add_message("Press Ctrl+Q to exit", "info")
             self.connected = False
@@ -312,49 +391,51 @@ class ChatClient(App):
             self.add_message("Press Ctrl+Q to exit", "info")
             self.connected = False
 
-    def receive_messages(self):
+        self.close_connection()
+        return False
+
+    async def receive_messages(self):
         """Receive messages from the server."""
-        while self.connected:
-            try:
-                data = self.client.recv(BUFFER_SIZE)
+        try:
+            # One complete message per frame, however TCP segmented them
+            while self.connected:
+                data = await read_frame(self._reader)
 
-                if not data:
-                    self.add_message("Server disconnected", "error")
+                if data is None:
+                    if self.connected:
+                        self.add_message("Server disconnected", "error")
                     break
 
-                message = data.decode('utf-8')
-
-                if "shutting down" in message.lower():
-                    self.add_message("Server is shutting down...", "system")
-                    self.connected = False
+                if data == _SHUTDOWN_B:
+                    self.add_message(SHUTDOWN_MESSAGE, "system")
                     break
 
-                self.add_message(message, "received")
+                self.add_message(data.decode('utf-8'), "received")
 
-            except ConnectionAbortedError:
-                self.add_message("Connection aborted", "error")
-                self.connected = False
-                break
-            except ConnectionResetError:
-                self.add_message("Connection reset by server", "error")
-                self.connected = False
-                break
-            except Exception as e:
-                self.add_message(f"Error receiving: {e}", "error")
-                self.connected = False
-                break
+        except ConnectionAbortedError:
+            self.add_message("Connection aborted", "error")
+        except ConnectionResetError:
+            self.add_message("Connection reset by server", "error")
+        except Exception as e:
+            self.add_message(f"Error receiving: {e}", "error")
 
         self.connected = False
-        if self.client:
-            try:
+        self.close_connection()
+
+    def close_connection(self):
+        """Close the server connection, if any."""
+        try:
+            if self._writer:
+                self._writer.close()
+            elif self.client:
                 self.client.close()
-            except:
-                pass
+        except:
+            pass
 
     @on(Input.Submitted, "#message_input")
     def send_message(self):
         """Send message to server."""
-        input_widget = self.query_one("#message_input")
+        input_widget = self._input
         message = input_widget.value.strip()
 
         if not message:
@@ -367,17 +448,26 @@ class ChatClient(App):
             return
 
         # Handle client commands first
-        if message.startswith('/'):
-            if self.handle_client_command(message):
-                input_widget.value = ""
-                return
+        first, _, _ = message.partition(" ")
+        handler = _CLIENT_COMMANDS.get(first.lower())
+        if handler:
+            handler(self)
+            input_widget.value = ""
+            return
 
         # Send message to server
         try:
-            self.client.send(message.encode('utf-8'))
+            frame = encode_frame(message)
+        except ValueError:
+            # Too big for one frame; keep the text so it can be shortened
+            self.add_message("Message too long to send", "error")
+            return
+
+        try:
+            self._writer.write(frame)
 
             # Show our message locally if it's not a whisper command
-            if not message.startswith('/w '):
+            if first != "/w":
                 self.add_message(message, "sent")
             input_widget.value = ""
 
@@ -387,22 +477,22 @@ class ChatClient(App):
 
     # Navigation actions
     def action_scroll_up(self):
-        self.query_one("#messages").scroll_up()
+        self._messages.scroll_up()
 
     def action_scroll_down(self):
-        self.query_one("#messages").scroll_down()
+        self._messages.scroll_down()
 
     def action_page_up(self):
-        self.query_one("#messages").scroll_page_up()
+        self._messages.scroll_page_up()
 
     def action_page_down(self):
-        self.query_one("#messages").scroll_page_down()
+        self._messages.scroll_page_down()
 
     def action_scroll_home(self):
-        self.query_one("#messages").scroll_home()
+        self._messages.scroll_home()
 
     def action_scroll_end(self):
-        self.query_one("#messages").scroll_end()
+        self._messages.scroll_end()
 
     def action_show_help(self):
         self.show_client_help()
@@ -410,9 +500,12 @@ class ChatClient(App):
     def action_quit(self):
         """Exit the application."""
         self.connected = False
-        if self.client:
-            try:
-                self.client.close()
-            except:
-                pass
+        clear_parse_cache()
+        self.close_connection()
         self.exit()
+
+
+# Commands handled locally by the client, keyed by their first token
+_CLIENT_COMMANDS = {
+    "/help": ChatClient.show_client_help,
+}
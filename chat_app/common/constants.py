@@ -6,6 +6,15 @@ PROTOCOL_SERVER_FULL = "SERVER_FULL"
 PROTOCOL_USERNAME_TAKEN = "USERNAME_TAKEN"
 PROTOCOL_CONNECTED = "CONNECTED"
 
+# Sent on every connection refused at capacity, so keep it pre-encoded
+PROTOCOL_SERVER_FULL_BYTES = PROTOCOL_SERVER_FULL.encode('utf-8')
+
+# Broadcast to every client just before the server closes
+SHUTDOWN_MESSAGE = "Server is shutting down..."
+
+# Sent to a user right before the server drops them
+KICK_MESSAGE = "You have been kicked from the server"
+
 # Message types
 MSG_TYPE_SYSTEM = "system"
 MSG_TYPE_PRIVATE = "private"
@@ -45,7 +54,17 @@ DEFAULT_MAX_CLIENTS = 5
 DEFAULT_NICKNAME = "User"
 DEFAULT_HOST = "127.0.0.1"
 
+# Moderation
+SWEEP_INTERVAL = 60.0  # Seconds between purges of expired mutes and kicks
+KICK_MEMORY = 3600.0  # Seconds a kick stays on record
+
+# History
+HISTORY_MEMORY_SIZE = 1000  # Recent entries kept in RAM; the rest live only on disk
+HISTORY_FLUSH_BATCH = 256  # Entries buffered before one write to the spool file
+
 # Network settings
-SOCKET_TIMEOUT = 1.0
 CONNECT_TIMEOUT = 10.0
-BUFFER_SIZE = 1024
+HANDSHAKE_TIMEOUT = 5.0  # Seconds the server waits for a new client's nickname
+SOCKET_BUFFER_SIZE = 262144  # SO_SNDBUF / SO_RCVBUF
+MAX_PENDING_OUTPUT = 1048576  # Bytes queued for one client before it counts as stuck
+MAX_FRAME_SIZE = 0xFFFF  # Largest payload a 2-byte length prefix can describe
@@ -1,59 +1,135 @@
 """Protocol definitions for client-server communication."""
 
-from typing import Tuple, Optional
-from .constants import SYSTEM_PREFIX, PRIVATE_PREFIX
-
-
-def parse_server_message(message: str) -> dict:
+import asyncio
+import struct
+from functools import lru_cache
+from typing import NamedTuple, Tuple, Optional
+from .constants import SYSTEM_PREFIX, PRIVATE_PREFIX, MAX_FRAME_SIZE
+
+# Wire format: every message is a 2-byte big-endian payload length followed
+# by the UTF-8 payload
+_HDR = struct.Struct(">H")
+_hdr_pack = _HDR.pack
+_hdr_unpack = _HDR.unpack_from
+FRAME_HEADER_SIZE = _HDR.size
+
+_SYSTEM_PREFIX_LEN = len(SYSTEM_PREFIX)
+SYSTEM_PREFIX_BYTES = f"{SYSTEM_PREFIX} ".encode('utf-8')
+_PRIVATE_PREFIX_LEN = len(PRIVATE_PREFIX)
+
+# Only short payloads are worth caching: notices repeat, long chat lines
+# don't, and a cached entry keeps both raw and content alive
+_PARSE_CACHE_MAX_LEN = 256
+
+
+class ParsedMessage(NamedTuple):
+    """Immutable result of parsing a server message."""
+    raw: str
+    type: str = "normal"
+    content: str = ""
+    user_color: Optional[str] = None
+    username: Optional[str] = None
+    is_system: bool = False
+    is_private: bool = False
+
+
+def parse_server_message(message: str) -> ParsedMessage:
     """
     Parse a message from the server.
 
-    Returns a dict with type, content, and metadata.
+    Short results are cached per raw message, so repeated payloads
+    (join/leave notices, duplicates) skip the parsing work entirely.
     """
-    result = {
-        "raw": message,
-        "type": "normal",
-        "content": message,
-        "user_color": None,
-        "username": None,
-        "is_system": False,
-        "is_private": False
-    }
+    if len(message) > _PARSE_CACHE_MAX_LEN:
+        return _parse(message)
+    return _parse_cached(message)
+
 
+def _parse(message: str) -> ParsedMessage:
+    """Parse a raw server message (uncached)."""
     # Check for system message
     if message.startswith(SYSTEM_PREFIX):
-        result["type"] = "system"
-        result["is_system"] = True
-        result["content"] = message[len(SYSTEM_PREFIX):].strip()
-        return result
+        return ParsedMessage(
+            raw=message,
+            type="system",
+            content=message[_SYSTEM_PREFIX_LEN:].strip(),
+            is_system=True
+        )
 
     # Check for private message
     if message.startswith(PRIVATE_PREFIX):
-        result["type"] = "private"
-        result["is_private"] = True
-        content = message[len(PRIVATE_PREFIX):].strip()
+        content = message[_PRIVATE_PREFIX_LEN:].strip()
+        user_color = None
 
         # Extract color if present
-        if "|" in content:
-            msg_content, color = content.rsplit("|", 1)
-            result["content"] = msg_content.strip()
-            result["user_color"] = color
-        else:
-            result["content"] = content
-        return result
+        idx = content.rfind("|")
+        if idx >= 0:
+            user_color = content[idx + 1:]
+            content = content[:idx].strip()
+
+        return ParsedMessage(
+            raw=message,
+            type="private",
+            content=content,
+            user_color=user_color,
+            is_private=True
+        )
 
     # Check for colored user message
-    if "|" in message:
-        content, color = message.rsplit("|", 1)
-        result["content"] = content
-        result["user_color"] = color
+    idx = message.rfind("|")
+    if idx >= 0:
+        content = message[:idx]
+        color = message[idx + 1:]
+        username = None
 
         # Extract username if possible
-        if ": " in content:
-            username, _ = content.split(": ", 1)
-            result["username"] = username
+        head, sep, _ = content.partition(": ")
+        if sep:
+            username = head
+
+        return ParsedMessage(
+            raw=message,
+            content=content,
+            user_color=color,
+            username=username
+        )
+
+    return ParsedMessage(raw=message, content=message)
+
+
+_parse_cached = lru_cache(maxsize=2048)(_parse)
+
+
+def clear_parse_cache():
+    """Drop all cached parse results (called on client shutdown)."""
+    _parse_cached.cache_clear()
+
 
-    return result
+def encode_frame(message: str) -> bytes:
+    """Encode a message as a length-prefixed frame."""
+    return encode_frame_bytes(message.encode('utf-8'))
+
+
+def encode_frame_bytes(payload: bytes) -> bytes:
+    """
+    Frame an already UTF-8 encoded payload.
+
+    Raises ValueError if the payload does not fit in one frame; cutting it
+    would drop the trailing "|color" that receivers parse.
+    """
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"payload of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte frame limit")
+    return _hdr_pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Read the next payload from an asyncio stream, or None once it closes."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER_SIZE)
+        (length,) = _hdr_unpack(header)
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
 
 
 def format_user_message(username: str, message: str, color: str) -> str:
@@ -66,6 +142,11 @@ def format_system_message(message: str) -> str:
     return f"{SYSTEM_PREFIX} {message}"
 
 
+def format_system_message_bytes(message: str) -> bytes:
+    """Format a system message straight to its UTF-8 payload."""
+    return SYSTEM_PREFIX_BYTES + message.encode('utf-8')
+
+
 def format_private_message(sender: str, receiver: str, message: str) -> Tuple[str, str]:
     """
     Format private messages for sender and receiver.
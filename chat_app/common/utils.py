@@ -5,9 +5,23 @@ from datetime import datetime
 from typing import Optional
 
 
+# (second, format, formatted) of the last get_timestamp() call. Stored as a
+# single tuple so concurrent callers never see a mismatched pair; a race only
+# means both threads format the same second.
+_last_timestamp = (-1, "", "")
+
+
 def get_timestamp(format: str = "%H:%M:%S") -> str:
-    """Get current timestamp."""
-    return time.strftime(format)
+    """Get current timestamp (formatted at most once per second)."""
+    global _last_timestamp
+    now = int(time.time())
+    last_sec, last_format, last_str = _last_timestamp
+    if now == last_sec and format == last_format:
+        return last_str
+
+    formatted = time.strftime(format, time.localtime(now))
+    _last_timestamp = (now, format, formatted)
+    return formatted
 
 
 def get_datetime_string() -> str:
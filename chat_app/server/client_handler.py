@@ -1,69 +1,133 @@
 """Client connection handler."""
 
+import asyncio
+import logging
 import socket
-import threading
-import time
 from typing import Dict, Any, Optional
 
-from ..common.constants import BUFFER_SIZE, SOCKET_TIMEOUT
-from ..common.protocols import format_user_message, format_system_message
+from ..common.constants import (
+    PROTOCOL_NICK, PROTOCOL_USERNAME_TAKEN, PROTOCOL_CONNECTED, HANDSHAKE_TIMEOUT,
+    SOCKET_BUFFER_SIZE, MAX_FRAME_SIZE
+)
+from ..common.protocols import (
+    format_user_message, format_system_message, format_system_message_bytes,
+    encode_frame, encode_frame_bytes, read_frame
+)
 from .moderation import ModerationManager
 
+logger = logging.getLogger(__name__)
+
+# Handshake frames never change, so encode them once at import
+_NICK_FRAME = encode_frame(PROTOCOL_NICK)
+_CONNECTED_FRAME = encode_frame(PROTOCOL_CONNECTED)
+_USERNAME_TAKEN_FRAME = encode_frame(
+    f"{PROTOCOL_USERNAME_TAKEN}|Username not available. There's already someone with "
+    "that username in the chat. Choose a different one to join."
+)
+
+# Fixed replies to whisper/mute violations
+_USAGE_WHISPER_FRAME = encode_frame(format_system_message("Usage: /w username message"))
+_WHISPER_SELF_FRAME = encode_frame(format_system_message("You cannot whisper to yourself"))
+_TOO_LONG_FRAME = encode_frame(format_system_message("Message too long, it was not sent"))
+_MUTED_PREFIX = format_system_message_bytes("You are currently muted (")
+_MUTED_SUFFIX = b"s remaining)"
+
+
+def _muted_frame(remaining: int) -> bytes:
+    """Build the 'currently muted' notice; only the countdown gets encoded."""
+    return encode_frame_bytes(_MUTED_PREFIX + str(remaining).encode('ascii') + _MUTED_SUFFIX)
+
 
 class ClientHandler:
     """Handles individual client connections."""
 
-    def __init__(self, client: socket.socket, address: tuple,
-                 server_ref, moderation: ModerationManager):
+    def __init__(self, reader: asyncio.StreamReader, client: asyncio.StreamWriter,
+                 address: tuple, server_ref, moderation: ModerationManager):
         self.client = client
+        self.reader = reader
+        self._tune_socket()
         self.address = address
         self.server = server_ref
         self.moderation = moderation
         self.nickname: Optional[str] = None
         self.color: Optional[str] = None
         self.running = False
-
-    def start(self):
-        """Start handling this client."""
+        # Encoded "<nick>: " and "|<color>" around every message this client sends
+        self._nick_prefix = b""
+        self._color_suffix = b""
+
+    def _tune_socket(self):
+        """
+        Disable Nagle for small chat frames, let the OS probe dead peers and
+        give broadcast bursts room in the kernel buffers.
+        """
+        sock = self.client.get_extra_info('socket')
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        except OSError as e:
+            print(f"[-] Could not tune socket for {self.address}: {e}")
+
+    async def handle(self):
+        """Handle this client until it disconnects."""
         self.running = True
-        thread = threading.Thread(target=self._handle, daemon=True)
-        thread.start()
+        await self._handle()
 
     def _is_username_taken(self, nickname: str) -> bool:
         """Check if a username is already in use."""
-        for client, info in self.server.client_info.items():
-            if info["nickname"].lower() == nickname.lower():  # Case-insensitive comparison
-                return True
-        return False
+        return nickname.lower() in self.server.nicknames_lower  # Case-insensitive comparison
+
+    async def _read_message(self) -> Optional[str]:
+        """Read the next frame as text, or None once the peer is gone."""
+        payload = await read_frame(self.reader)
+        if payload is None:
+            return None
+        return payload.decode('utf-8')
 
-    def _handle(self):
+    async def _handle(self):
         """Main client handling loop."""
         try:
             print(f"[+] New connection: {self.address}")
 
             # Request nickname
-            self.client.send("NICK".encode('utf-8'))
-            self.nickname = self.client.recv(BUFFER_SIZE).decode('utf-8')
+            self.client.write(_NICK_FRAME)
+            try:
+                self.nickname = await asyncio.wait_for(self._read_message(), HANDSHAKE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[-] {self.address} sent no nickname within {HANDSHAKE_TIMEOUT:g}s")
+                return
+            if not self.nickname:
+                print(f"[-] {self.address} closed before sending a nickname")
+                return
 
             # Check if username is already taken
             if self._is_username_taken(self.nickname):
-                error_msg = "USERNAME_TAKEN|Username not available. There's already someone with that username in the chat. Choose a different one to join."
-                self.client.send(error_msg.encode('utf-8'))
+                self.client.write(_USERNAME_TAKEN_FRAME)
                 self.client.close()
                 print(f"[-] Client rejected - username '{self.nickname}' already taken: {self.address}")
                 return
 
             self.color = self.moderation.assign_color()
 
-            # Send confirmation
-            self.client.send("CONNECTED".encode('utf-8'))
-
             # Register with server
-            self.server.register_client(self.client, {
+            if not self.server.register_client(self.client, {
                 "nickname": self.nickname,
                 "color": self.color,
                 "address": self.address
-            })
+            }):
+                self.moderation.release_color(self.color)
+                self.client.write(_USERNAME_TAKEN_FRAME)
+                self.client.close()
+                return
+
+            # Send confirmation
+            self.client.write(_CONNECTED_FRAME)
+            self._nick_prefix = f"{self.nickname}: ".encode('utf-8')
+            self._color_suffix = f"|{self.color}".encode('utf-8')
 
             print(f"[+] Nickname received: {self.nickname} (color: {self.color})")
 
@@ -77,48 +141,44 @@ class ClientHandler:
             # Message loop
             while self.running and self.server.running:
                 try:
-                    # Verificar si el cliente todavía está en la lista del servidor
-                    if self.client not in self.server.clients:
-                        print(f"[-] {self.nickname} removed from server list, disconnecting")
-                        break
-
-                    # Intentar recibir con timeout corto
-                    self.client.settimeout(0.5)
-                    data = self.client.recv(BUFFER_SIZE)
+                    # Esperar el siguiente mensaje (el loop atiende a los demás mientras tanto).
+                    # Kick y shutdown cierran el writer, así que aquí llega EOF
+                    payload = await read_frame(self.reader)
 
-                    if not data:
+                    if payload is None:
                         print(f"[-] {self.nickname} disconnected")
                         break
 
-                    message = data.decode('utf-8')
-                    print(f"{self.nickname}: {message}")
+                    # Check for private message (one byte compare before decoding)
+                    is_whisper = payload.startswith(b'/w ')
+                    message = payload.decode('utf-8')
+                    logger.debug("%s: %s", self.nickname, message)
 
-                    # Check for private message
-                    if message.startswith('/w '):
+                    if is_whisper:
                         self._handle_private_message(message)
                         continue
 
                     # Check if muted
                     muted, remaining = self.moderation.is_muted(self.nickname)
                     if muted:
-                        self.client.send(
-                            format_system_message(
-                                f"You are currently muted ({remaining}s remaining)"
-                            ).encode('utf-8')
-                        )
+                        self.client.write(_muted_frame(remaining))
                         continue
 
-                    # Normal message
+                    # The nick prefix and color suffix must still fit in one frame,
+                    # otherwise the color (what recipients parse) would not arrive intact
+                    if (len(self._nick_prefix) + len(payload)
+                            + len(self._color_suffix)) > MAX_FRAME_SIZE:
+                        self.client.write(_TOO_LONG_FRAME)
+                        continue
+
+                    # Normal message: wrap the received bytes as they are (same wire form as
+                    # format_user_message) and share the frame with every recipient
                     self.server.add_to_history(f"{self.nickname}: {message}")
-                    self.server.broadcast(
-                        f"{self.nickname}: {message}",
-                        self.client,
-                        user_color=self.color
+                    self.server.broadcast_bytes(
+                        encode_frame_bytes(self._nick_prefix + payload + self._color_suffix),
+                        self.client
                     )
 
-                except socket.timeout:
-                    # Timeout es normal, solo verificar si seguimos conectados
-                    continue
                 except (ConnectionResetError, ConnectionAbortedError):
                     print(f"[-] Connection lost with {self.nickname}")
                     break
@@ -148,15 +208,11 @@ class ClientHandler:
         # Check if muted
         muted, remaining = self.moderation.is_muted(self.nickname)
         if muted:
-            self.client.send(
-                format_system_message(
-                    f"You are currently muted ({remaining}s remaining)"
-                ).encode('utf-8')
-            )
+            self.client.write(_muted_frame(remaining))
             return
 
         # Normal message
-        print(f"{self.nickname}: {message}")
+        logger.debug("%s: %s", self.nickname, message)
         self.server.add_to_history(f"{self.nickname}: {message}")
 
         self.server.broadcast(
@@ -167,35 +223,31 @@ class ClientHandler:
 
     def _handle_private_message(self, message: str):
         """Handle private message command."""
-        parts = message.split(' ', 2)
-        if len(parts) < 3:
-            self.client.send(
-                format_system_message("Usage: /w username message").encode('utf-8')
-            )
+        # "/w <receiver> <message>": slice at the name boundary instead of splitting
+        end = message.find(' ', 3)
+        if end < 0:
+            self.client.write(_USAGE_WHISPER_FRAME)
             return
 
-        receiver = parts[1]
-        private_msg = parts[2]
+        receiver = message[3:end]
+        private_msg = message[end + 1:]
 
         # Check self whisper
         if receiver == self.nickname:
-            self.client.send(
-                format_system_message("You cannot whisper to yourself").encode('utf-8')
-            )
+            self.client.write(_WHISPER_SELF_FRAME)
             return
 
         # Check if sender is muted
         muted, remaining = self.moderation.is_muted(self.nickname)
         if muted:
-            self.client.send(
-                format_system_message(
-                    f"You are currently muted ({remaining}s remaining)"
-                ).encode('utf-8')
-            )
+            self.client.write(_muted_frame(remaining))
             return
 
-        self.server.send_private_message(self.client, self.nickname,
-                                         receiver, private_msg, self.color)
+        try:
+            self.server.send_private_message(self.client, self.nickname,
+                                             receiver, private_msg, self.color)
+        except ValueError:
+            self.client.write(_TOO_LONG_FRAME)
 
     def cleanup(self):
         """Clean up client resources."""
@@ -1,8 +1,21 @@
 """Chat history management."""
 
 import os
+import shutil
+import tempfile
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import Deque, IO, List, Optional, Tuple
+
+from ..common.constants import HISTORY_MEMORY_SIZE, HISTORY_FLUSH_BATCH
+from ..common.utils import get_timestamp
+
+
+@lru_cache(maxsize=None)
+def _type_prefix(message_type: str) -> str:
+    """Line prefix for an entry type ("" for plain messages)."""
+    return f"[{message_type.upper()}]" if message_type != "message" else ""
 
 
 class ChatHistory:
@@ -11,21 +24,38 @@ class ChatHistory:
     def __init__(self, host: str, port: int):
         self.host = host
         self.port = port
-        self.entries: List[Dict] = []
+        self.entries: Deque[Tuple[str, str, str]] = deque(maxlen=HISTORY_MEMORY_SIZE)  # (timestamp, type, message)
+        self.count = 0
+        self.started: Optional[str] = None
         self.history_dir = "chat_history"
+        # Every formatted line so far, streamed to an anonymous temp file so
+        # memory stays bounded however long the session runs
+        self._spool: Optional[IO[str]] = None
+        self._pending: List[str] = []  # Formatted lines not yet written to the spool
 
     def add(self, message: str, message_type: str = "message"):
         """Add a message to history."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.entries.append({
-            "timestamp": timestamp,
-            "message": message,
-            "type": message_type
-        })
+        timestamp = get_timestamp("%Y-%m-%d %H:%M:%S")  # Cached per second
+        if self.started is None:
+            self.started = timestamp
+        self._pending.append("%s [%s] %s\n" % (_type_prefix(message_type), timestamp, message))
+        self.entries.append((timestamp, message_type, message))
+        self.count += 1
+        if len(self._pending) >= HISTORY_FLUSH_BATCH:
+            self.flush()
+
+    def flush(self):
+        """Write pending lines to the spool in a single call."""
+        if not self._pending:
+            return
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._spool.write("".join(self._pending))
+        self._pending.clear()
 
     def save(self) -> Optional[str]:
         """Save chat history to a file. Returns filename if successful."""
-        if not self.entries:
+        if not self.count:
             print("[+] No chat history to save")
             return None
 
@@ -43,25 +73,27 @@ class ChatHistory:
         filename = f"chat-history_{shutdown_time}.txt"
         filepath = os.path.join(self.history_dir, filename)
 
+        rule = "=" * 60
+        header = (
+            f"{rule}\n"
+            f"CHAT HISTORY - Server {self.host}:{self.port}\n"
+            f"Session started: {self.started or 'N/A'}\n"
+            f"Session ended: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"Total messages: {self.count}\n"
+            f"{rule}\n\n"
+        )
+        footer = f"\n{rule}\nEND OF CHAT HISTORY\n{rule}\n"
+
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
-                # Write header
-                f.write("=" * 60 + "\n")
-                f.write(f"CHAT HISTORY - Server {self.host}:{self.port}\n")
-                f.write(f"Session started: {self.entries[0]['timestamp'] if self.entries else 'N/A'}\n")
-                f.write(f"Session ended: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total messages: {len(self.entries)}\n")
-                f.write("=" * 60 + "\n\n")
-
-                # Write all messages
-                for entry in self.entries:
-                    prefix = f"[{entry['type'].upper()}]" if entry['type'] != "message" else ""
-                    f.write(f"{prefix} [{entry['timestamp']}] {entry['message']}\n")
-
-                # Write footer
-                f.write("\n" + "=" * 60 + "\n")
-                f.write("END OF CHAT HISTORY\n")
-                f.write("=" * 60 + "\n")
+                f.write(header)
+                # Copy the already formatted lines straight from the spool
+                self.flush()
+                self._spool.flush()
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, f)
+                self._spool.seek(0, os.SEEK_END)
+                f.write(footer)
 
             print(f"[+] Chat history saved to: {filepath}")
             return filepath
@@ -69,3 +101,10 @@ class ChatHistory:
         except Exception as e:
             print(f"[-] Error saving chat history: {e}")
             return None
+
+    def close(self):
+        """Discard the on-disk spool."""
+        self._pending.clear()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
@@ -1,48 +1,74 @@
 """Moderation commands and user management."""
 
-from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Tuple, Set
-import socket
-from ..common.constants import USER_COLORS
-from ..common.protocols import format_system_message
+import heapq
+import time
+from typing import Dict, Optional, List, Tuple
+import asyncio
+from ..common.constants import USER_COLORS, KICK_MESSAGE, KICK_MEMORY
+from ..common.protocols import format_system_message, encode_frame
+
+# Sent to a kicked user; the server console kick reuses it
+KICK_FRAME = encode_frame(format_system_message(KICK_MESSAGE))
+
+# Bit i of the free-color mask stands for USER_COLORS[i]
+_COLOR_INDEX = {color: i for i, color in enumerate(USER_COLORS)}
 
 
 class ModerationManager:
     """Handles all user moderation (mute, kick, ban, etc.)"""
 
     def __init__(self):
-        self.muted_users: Dict[str, datetime] = {}
-        self.available_colors = USER_COLORS.copy()
+        self.muted_users: Dict[str, float] = {}  # nickname -> time.monotonic() deadline
+        # (deadline, nickname, is_kick) for mutes and kicks alike, soonest first
+        self._expiry_heap: List[Tuple[float, str, bool]] = []
+        self._free_colors = (1 << len(USER_COLORS)) - 1  # Bitmask of unassigned colors
         self.user_colors: Dict[str, str] = {}
-        self.kicked_users: Set[str] = set()  # Historial de kicks recientes
+        self.kicked_users: Dict[str, float] = {}  # Historial de kicks recientes (nickname -> deadline)
 
     # Color management
     def assign_color(self) -> str:
         """Assign a unique color to a new user."""
-        if self.available_colors:
-            return self.available_colors.pop(0)
+        free = self._free_colors
+        if free:
+            # Take the lowest free bit and clear it
+            self._free_colors = free & (free - 1)
+            return USER_COLORS[(free & -free).bit_length() - 1]
         return "#666666"
 
     def release_color(self, color: str):
         """Release a color when a user disconnects."""
-        if color in USER_COLORS and color not in self.available_colors:
-            self.available_colors.append(color)
+        index = _COLOR_INDEX.get(color)
+        if index is not None:
+            self._free_colors |= 1 << index
+
+    def sweep_expired(self, now: Optional[float] = None):
+        """Drop every mute and kick record whose deadline has passed."""
+        if now is None:
+            now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            deadline, nickname, is_kick = heapq.heappop(heap)
+            table = self.kicked_users if is_kick else self.muted_users
+            # Stale entry if the record was renewed or removed since
+            if table.get(nickname) == deadline:
+                del table[nickname]
 
     # Mute management
+
     def is_muted(self, nickname: str) -> Tuple[bool, Optional[int]]:
         """Check if a user is muted. Returns (is_muted, seconds_remaining)."""
-        if nickname in self.muted_users:
-            if self.muted_users[nickname] > datetime.now():
-                remaining = self.muted_users[nickname] - datetime.now()
-                return True, int(remaining.total_seconds())
-            else:
-                del self.muted_users[nickname]
-        return False, None
-
-    def mute(self, nickname: str, seconds: int) -> datetime:
-        """Mute a user for specified seconds. Returns mute expiry."""
-        mute_until = datetime.now() + timedelta(seconds=seconds)
+        now = time.monotonic()
+        self.sweep_expired(now)
+        deadline = self.muted_users.get(nickname)
+        if deadline is None:
+            return False, None
+        return True, int(deadline - now)
+
+    def mute(self, nickname: str, seconds: int) -> float:
+        """Mute a user for specified seconds. Returns mute expiry (monotonic clock)."""
+        mute_until = time.monotonic() + seconds
         self.muted_users[nickname] = mute_until
+        heapq.heappush(self._expiry_heap, (mute_until, nickname, False))
         return mute_until
 
     def unmute(self, nickname: str) -> bool:
@@ -53,7 +79,7 @@ class ModerationManager:
         return False
 
     # Kick management
-    def kick(self, client: socket.socket, nickname: str, color: str,
+    def kick(self, client: asyncio.StreamWriter, nickname: str, color: str,
              server_ref) -> Tuple[bool, str]:
         """
         Kick a user from the server.
@@ -61,14 +87,13 @@ class ModerationManager:
         """
         try:
             # Enviar mensaje de kick
-            kick_msg = format_system_message("You have been kicked from the server")
-            client.send(kick_msg.encode('utf-8'))
+            client.write(KICK_FRAME)
 
-            # Close socket
+            # Close connection
             client.close()
 
             # Register kick
-            self.kicked_users.add(nickname)
+            self.record_kick(nickname)
 
             # Free resources
             self.release_color(color)
@@ -79,19 +104,26 @@ class ModerationManager:
         except Exception as e:
             return False, f"Error kicking user {nickname}: {e}"
 
+    def record_kick(self, nickname: str):
+        """Remember a kick; it is forgotten after KICK_MEMORY seconds."""
+        kicked_until = time.monotonic() + KICK_MEMORY
+        self.kicked_users[nickname] = kicked_until
+        heapq.heappush(self._expiry_heap, (kicked_until, nickname, True))
+
     def was_kicked(self, nickname: str) -> bool:
         """Check if a user was recently kicked."""
-        return nickname in self.kicked_users
+        deadline = self.kicked_users.get(nickname)
+        return deadline is not None and deadline > time.monotonic()
 
     def clear_kick_history(self, nickname: str):
         """Clear kick history for a user (when they reconnect later)."""
-        if nickname in self.kicked_users:
-            self.kicked_users.remove(nickname)
+        self.kicked_users.pop(nickname, None)
 
     # User listing
     def get_user_list(self, users_info: Dict) -> List[str]:
         """Get formatted list of users with status."""
         users = []
+        self.sweep_expired()
         for client, info in users_info.items():
             muted, remaining = self.is_muted(info["nickname"])
             status = f"muted ({remaining}s)" if muted else "active"
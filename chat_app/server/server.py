@@ -1,21 +1,41 @@
 """Main server implementation."""
 
+import asyncio
+import io
+import logging
+import logging.handlers
+import os
+import queue
 import socket
+import sys
 import threading
-import time
-from typing import Dict, List, Optional, Any
+from typing import Dict, Optional, Any, Set
+
+try:
+    import uvloop  # Optional: faster drop-in event loop (not available on Windows)
+except ImportError:
+    uvloop = None
 
 from ..common.constants import (
-    PROTOCOL_SERVER_FULL, DEFAULT_PORT, DEFAULT_MAX_CLIENTS,
-    SOCKET_TIMEOUT, BUFFER_SIZE
+    PROTOCOL_SERVER_FULL_BYTES, DEFAULT_PORT, DEFAULT_MAX_CLIENTS,
+    SHUTDOWN_MESSAGE, SWEEP_INTERVAL, MAX_PENDING_OUTPUT
 )
 from ..common.protocols import (
-    format_system_message, format_private_message, format_user_message
+    format_system_message, format_private_message, format_user_message,
+    format_system_message_bytes, encode_frame, encode_frame_bytes
 )
 from .history import ChatHistory
-from .moderation import ModerationManager
+from .moderation import ModerationManager, KICK_FRAME
 from .client_handler import ClientHandler
 
+_SHUTDOWN_FRAME = encode_frame(format_system_message(SHUTDOWN_MESSAGE))
+_SERVER_FULL_FRAME = encode_frame_bytes(PROTOCOL_SERVER_FULL_BYTES)
+
+logger = logging.getLogger(__name__)
+
+# Set CHAT_DEBUG=1 to echo every chat message on the server console
+_DEBUG = bool(os.environ.get("CHAT_DEBUG"))
+
 
 class ChatServer:
     """Main chat server."""
@@ -29,42 +49,66 @@ class ChatServer:
         # Server state
         self.running = False
         self.is_shutting_down = False
-        self.server_socket: Optional[socket.socket] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
 
-        # Client management
-        self.clients: List[socket.socket] = []
-        self.client_info: Dict[socket.socket, Dict] = {}
+        # Client management (keyed by each connection's StreamWriter)
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.client_info: Dict[asyncio.StreamWriter, Dict] = {}
+        self.nicknames_lower: Set[str] = set()  # Nicknames in use, for O(1) lookups
+        self.nickname_index: Dict[str, asyncio.StreamWriter] = {}  # Exact nickname -> writer
 
         # Managers
         self.moderation = ModerationManager()
         self.history = ChatHistory(host, port)
 
-        # Threads
-        self.accept_thread: Optional[threading.Thread] = None
+        # Console
         self.console_thread: Optional[threading.Thread] = None
+        self._console_fd: Optional[int] = None
+        self._console_buffer = bytearray()
+
+        # Logging (records are written by the listener's thread, off the event loop)
+        self._log_handler: Optional[logging.Handler] = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+
+    def _start_logging(self):
+        """Route server log records through a queue to a background writer."""
+        log_queue = queue.Queue()
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(logging.Formatter("%(message)s"))
+        self._log_listener = logging.handlers.QueueListener(log_queue, output)
+        self._log_handler = logging.handlers.QueueHandler(log_queue)
+
+        server_logger = logging.getLogger("chat_app.server")
+        server_logger.addHandler(self._log_handler)
+        server_logger.setLevel(logging.DEBUG if _DEBUG else logging.INFO)
+        server_logger.propagate = False
+        self._log_listener.start()
+
+    def _stop_logging(self):
+        """Flush pending log records and detach the queue handler."""
+        if self._log_listener:
+            self._log_listener.stop()
+            self._log_listener = None
+        if self._log_handler:
+            logging.getLogger("chat_app.server").removeHandler(self._log_handler)
+            self._log_handler = None
 
     def start(self):
         """Start the server."""
+        self._start_logging()
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen()
-            self.server_socket.settimeout(SOCKET_TIMEOUT)
-
-            self.running = True
-            print(f"[+] Server listening on {self.host}:{self.port}")
-            print(f"[+] Maximum capacity: {self.max_clients} clients")
-
-            self.history.add(f"Server started on {self.host}:{self.port}", "server")
-
-            # Start console thread
-            self.console_thread = threading.Thread(target=self._console_loop, daemon=True)
-            self.console_thread.start()
-
-            # Accept connections
-            self._accept_loop()
-
+            if uvloop is not None:
+                print("[+] Using uvloop event loop")
+                if hasattr(uvloop, "run"):
+                    uvloop.run(self._serve())
+                else:
+                    # uvloop < 0.18 has no run(); install its policy instead
+                    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+                    asyncio.run(self._serve())
+            else:
+                asyncio.run(self._serve())
         except KeyboardInterrupt:
             print("\n[+] Server interrupted by user")
         except Exception as e:
@@ -72,60 +116,197 @@ class ChatServer:
         finally:
             self.cleanup()
 
-    def _accept_loop(self):
-        """Main accept loop for new connections."""
-        while self.running:
+    async def _serve(self):
+        """Serve all connections from one event loop until shutdown."""
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.server = await asyncio.start_server(
+            self._accept_client, self.host, self.port, reuse_address=True
+        )
+        # Accepted sockets inherit the listener's options on most kernels, so
+        # rejected connections get Nagle off too (ClientHandler sets it again)
+        for listener in self.server.sockets:
             try:
-                client, address = self.server_socket.accept()
+                listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
 
-                # Check capacity before creating handler
-                if len(self.clients) < self.max_clients:
-                    # NO agregamos a self.clients aquí - eso lo hará register_client
-                    handler = ClientHandler(client, address, self, self.moderation)
-                    handler.start()
-                else:
-                    client.send(PROTOCOL_SERVER_FULL.encode('utf-8'))
-                    client.close()
-                    print(f"[-] Connection rejected - server full: {address}")
+        self.running = True
+        print(f"[+] Server listening on {self.host}:{self.port}")
+        print(f"[+] Maximum capacity: {self.max_clients} clients")
 
-            except socket.timeout:
-                continue
-            except OSError as e:
-                if self.running:
-                    print(f"[-] Socket error: {e}")
-                break
+        self.history.add(f"Server started on {self.host}:{self.port}", "server")
 
-    def _console_loop(self):
-        """Server console input loop."""
+        # Console: watched by the loop's selector where possible, otherwise a
+        # thread blocked in input() hands each command over to the loop
+        if self._attach_console():
+            self._print_console_banner()
+            print("\n[SERVER] > ", end="", flush=True)
+        else:
+            self.console_thread = threading.Thread(target=self._console_loop, daemon=True)
+            self.console_thread.start()
+
+        sweeper = asyncio.ensure_future(self._sweep_loop())
+        try:
+            await self._stop_event.wait()
+        finally:
+            self.running = False
+            sweeper.cancel()
+            self._detach_console()
+            await self._close_connections()
+
+    async def _sweep_loop(self):
+        """Periodically purge expired moderation entries and flush history."""
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.moderation.sweep_expired()
+            self.history.flush()
+
+    async def _accept_client(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+        """Handle a new connection (one coroutine per client)."""
+        address = writer.get_extra_info('peername')
+
+        # Check capacity before creating handler
+        if len(self.clients) < self.max_clients:
+            # NO agregamos a self.clients aquí - eso lo hará register_client
+            handler = ClientHandler(reader, writer, address, self, self.moderation)
+            await handler.handle()
+        else:
+            writer.write(_SERVER_FULL_FRAME)
+            writer.close()
+            print(f"[-] Connection rejected - server full: {address}")
+
+    def stop(self):
+        """Ask the event loop to shut down (safe to call from any thread)."""
+        self.running = False
+        if self.loop and self._stop_event:
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+
+    def _run_in_loop(self, func, *args, **kwargs):
+        """Run func on the event loop from the console thread and return its result."""
+        async def call():
+            return func(*args, **kwargs)
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    def _print_console_banner(self):
+        """Show the console usage summary."""
         print(f"\n[SERVER CONSOLE] Maximum {self.max_clients} clients.")
         print("[+] Type messages to broadcast to all clients")
         print("[+] Type /help for moderation commands")
         print("[+] Type 'shutdown' to stop the server gracefully")
         print("[+] Type 'quit' to close console (server continues)")
 
+    def _console_command(self, user_input: str) -> bool:
+        """Run one console line (on the event loop). Returns False once the console closes."""
+        if user_input.lower() == 'quit':
+            print("Closing server console...")
+            return False
+        elif user_input.lower() == 'shutdown':
+            print("Shutting down server gracefully...")
+            self.stop()
+            return False
+        elif user_input.startswith('/'):
+            result = self._handle_moderation_command(user_input)
+            print(f"[MOD] {result}")
+            self.history.add(f"Server command: {user_input} -> {result}", "server")
+        elif user_input:
+            print(f"[SERVER] Sending: {user_input}")
+            self.broadcast(user_input, None, is_system=True)
+            self.history.add(f"Server broadcast: {user_input}", "server")
+        return True
+
+    def _attach_console(self) -> bool:
+        """
+        Read console input from the event loop itself. Returns False where
+        stdin can't be watched by the selector (Windows, redirected files)
+        and when it isn't a terminal: config prompts read a pipe through the
+        buffered sys.stdin, so lines already in that buffer never reach the fd.
+        """
+        try:
+            if not sys.stdin.isatty():
+                return False
+            fd = sys.stdin.fileno()
+            self.loop.add_reader(fd, self._on_console_readable)
+        except (AttributeError, ValueError, OSError, NotImplementedError, io.UnsupportedOperation):
+            return False
+        self._console_fd = fd
+        return True
+
+    def _detach_console(self):
+        """Stop watching stdin."""
+        if self._console_fd is not None:
+            self.loop.remove_reader(self._console_fd)
+            self._console_fd = None
+
+    def _on_console_readable(self):
+        """Handle whatever console input is ready, one command per line."""
+        try:
+            data = os.read(self._console_fd, 4096)
+        except OSError:
+            data = b""
+        if not data:
+            self._detach_console()
+            print("\nShutting down server gracefully...")
+            self.stop()
+            return
+
+        # Read raw bytes and split lines here: a buffered readline() could keep
+        # later lines in its buffer where the selector never sees them
+        buffer = self._console_buffer
+        buffer += data
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            user_input = buffer[:end].decode(sys.stdin.encoding or 'utf-8', 'replace').strip()
+            del buffer[:end + 1]
+            try:
+                if not self._console_command(user_input):
+                    self._detach_console()
+                    return
+            except Exception as e:
+                print(f"Console error: {e}")
+            print("\n[SERVER] > ", end="", flush=True)
+
+    def _console_input(self, prompt: str) -> str:
+        """
+        input() for prompts after the console stops (the save question).
+        Lines the selector path already read but didn't run are answered first.
+        """
+        encoding = sys.stdin.encoding or 'utf-8'
+        buffer = self._console_buffer
+        end = buffer.find(b"\n")
+        if end >= 0:
+            print(prompt, end="", flush=True)
+            line = buffer[:end].decode(encoding, 'replace')
+            del buffer[:end + 1]
+            print(line)
+            return line
+
+        # A partial line is the start of what input() reads next
+        pending = buffer.decode(encoding, 'replace')
+        buffer.clear()
+        try:
+            return pending + input(prompt)
+        except EOFError:
+            if pending:
+                return pending
+            raise
+
+    def _console_loop(self):
+        """Server console input loop (fallback thread where stdin can't be selected)."""
+        self._print_console_banner()
+
         while self.running:
             try:
                 user_input = input("\n[SERVER] > ").strip()
-
-                if user_input.lower() == 'quit':
-                    print("Closing server console...")
-                    break
-                elif user_input.lower() == 'shutdown':
-                    print("Shutting down server gracefully...")
-                    self.running = False
+                if not self._run_in_loop(self._console_command, user_input):
                     break
-                elif user_input.startswith('/'):
-                    result = self._handle_moderation_command(user_input)
-                    print(f"[MOD] {result}")
-                    self.history.add(f"Server command: {user_input} -> {result}", "server")
-                elif user_input:
-                    print(f"[SERVER] Sending: {user_input}")
-                    self.broadcast(user_input, None, is_system=True)
-                    self.history.add(f"Server broadcast: {user_input}", "server")
 
             except (KeyboardInterrupt, EOFError):
                 print("\nShutting down server gracefully...")
-                self.running = False
+                self.stop()
                 break
             except Exception as e:
                 print(f"Console error: {e}")
@@ -180,14 +361,8 @@ Server Commands:
 
     def _kick_user(self, nickname: str) -> str:
         """Kick a user from the server."""
-        client_to_kick = None
-        client_info = None
-
-        for client, info in self.client_info.items():
-            if info["nickname"] == nickname:
-                client_to_kick = client
-                client_info = info
-                break
+        client_to_kick = self.nickname_index.get(nickname)
+        client_info = self.client_info.get(client_to_kick)
 
         if client_to_kick and client_info:
             try:
@@ -196,6 +371,8 @@ Server Commands:
                     self.clients.remove(client_to_kick)
                 if client_to_kick in self.client_info:
                     del self.client_info[client_to_kick]
+                    self.nicknames_lower.discard(nickname.lower())
+                    self.nickname_index.pop(nickname, None)
 
                 # 2. Notificar a los demas ANTES de cerrar la conexión
                 broadcast_msg = f"{nickname} has been kicked from the server"
@@ -205,19 +382,16 @@ Server Commands:
                 # 3. Liberar recursos de moderación
                 self.moderation.release_color(client_info["color"])
                 self.moderation.unmute(nickname)
+                self.moderation.record_kick(nickname)
 
                 # 4. Enviar mensaje de kick al usuario
                 try:
-                    kick_msg = format_system_message("You have been kicked from the server")
-                    client_to_kick.send(kick_msg.encode('utf-8'))
+                    client_to_kick.write(KICK_FRAME)
                 except:
                     pass  # Si ya falló, no importa
 
-                # 5. Cerrar el socket inmediatamente
-                try:
-                    client_to_kick.shutdown(socket.SHUT_RDWR)  # Forzar cierre de ambas direcciones
-                except:
-                    pass
+                # 5. Cerrar la conexión (el transporte envía lo pendiente y cierra;
+                # el handler del usuario recibe EOF y termina)
                 client_to_kick.close()
 
                 print(f"[-] {nickname} kicked from server")
@@ -235,17 +409,13 @@ Server Commands:
         mute_until = self.moderation.mute(nickname, seconds)
 
         # Encontrar al usuario muteado
-        muted_client = None
-        for client, info in self.client_info.items():
-            if info["nickname"] == nickname:
-                muted_client = client
-                break
+        muted_client = self.nickname_index.get(nickname)
 
         # Mensaje personalizado para el usuario muteado
         if muted_client:
             try:
-                personal_msg = format_system_message(f"You have been muted for {seconds} seconds")
-                muted_client.send(personal_msg.encode('utf-8'))
+                personal_msg = format_system_message_bytes(f"You have been muted for {seconds} seconds")
+                muted_client.write(encode_frame_bytes(personal_msg))
             except:
                 pass
 
@@ -260,17 +430,13 @@ Server Commands:
         """Unmute a user."""
         if self.moderation.unmute(nickname):
             # Encontrar al usuario desmuteado
-            unmuted_client = None
-            for client, info in self.client_info.items():
-                if info["nickname"] == nickname:
-                    unmuted_client = client
-                    break
+            unmuted_client = self.nickname_index.get(nickname)
 
             # Mensaje personalizado para el usuario desmuteado
             if unmuted_client:
                 try:
-                    personal_msg = format_system_message("You have been unmuted")
-                    unmuted_client.send(personal_msg.encode('utf-8'))
+                    personal_msg = format_system_message_bytes("You have been unmuted")
+                    unmuted_client.write(encode_frame_bytes(personal_msg))
                 except:
                     pass
 
@@ -283,23 +449,26 @@ Server Commands:
 
         return f"User {nickname} is not muted"
 
-    def register_client(self, client: socket.socket, info: Dict):
-        """Register a new client."""
+    def register_client(self, client: asyncio.StreamWriter, info: Dict) -> bool:
+        """Register a new client. Returns False if the nickname is already taken."""
         # Verificación adicional para evitar duplicados
-        for existing_client, existing_info in self.client_info.items():
-            if existing_info["nickname"].lower() == info["nickname"].lower():
-                print(f"[-] Race condition: {info['nickname']} already registered")
-                return
+        nickname_lower = info["nickname"].lower()
+        if nickname_lower in self.nicknames_lower:
+            print(f"[-] Race condition: {info['nickname']} already registered")
+            return False
+        self.nicknames_lower.add(nickname_lower)
 
         # Add to clients list - SOLO AQUÍ se agrega
         if client not in self.clients:
-            self.clients.append(client)
+            self.clients.add(client)
             print(f"[+] Client added to clients list. Total: {len(self.clients)}")
 
         self.client_info[client] = info
+        self.nickname_index[info["nickname"]] = client
         print(f"[+] Client info registered for {info['nickname']}")
+        return True
 
-    def unregister_client(self, client: socket.socket, nickname: str, color: str):
+    def unregister_client(self, client: asyncio.StreamWriter, nickname: str, color: str):
         """Unregister a client."""
         print(f"[-] Unregistering {nickname}")
 
@@ -312,6 +481,8 @@ Server Commands:
 
         if was_in_info:
             del self.client_info[client]
+            self.nicknames_lower.discard(nickname.lower())
+            self.nickname_index.pop(nickname, None)
             print(f"[-] Removed from client_info")
 
         self.moderation.release_color(color)
@@ -331,114 +502,158 @@ Server Commands:
         """Add message to history."""
         self.history.add(message, message_type)
 
-    def broadcast(self, message: str, exclude_client: Optional[socket.socket] = None,
+    def _has_recipients(self, exclude_client: Optional[asyncio.StreamWriter]) -> bool:
+        """True if a broadcast excluding exclude_client would reach anyone."""
+        clients = self.clients
+        if len(clients) > 1:
+            return True
+        return bool(clients) and exclude_client not in clients
+
+    def broadcast(self, message: str, exclude_client: Optional[asyncio.StreamWriter] = None,
                  user_color: str = None, is_system: bool = False):
         """
         Send message to all connected clients except exclude_client.
         """
-        if not self.running:
+        if not self.running or not self._has_recipients(exclude_client):
             return
 
-        if is_system:
-            formatted = format_system_message(message)
-        elif user_color:
-            formatted = f"{message}|{user_color}"
-        else:
-            formatted = message
+        # Encode once; every recipient gets the same frame
+        try:
+            if is_system:
+                frame = encode_frame_bytes(format_system_message_bytes(message))
+            elif user_color:
+                frame = encode_frame(f"{message}|{user_color}")
+            else:
+                frame = encode_frame(message)
+        except ValueError:
+            print(f"[-] Broadcast dropped - message too long ({len(message)} characters)")
+            return
 
-        disconnected = []
-        # Iterar sobre una copia de la lista
-        for client in self.clients[:]:
+        self.broadcast_bytes(frame, exclude_client)
+
+    def broadcast_bytes(self, frame: bytes,
+                        exclude_client: Optional[asyncio.StreamWriter] = None):
+        """
+        Send an already encoded frame to all connected clients except exclude_client.
+        """
+        if not self.running or not self._has_recipients(exclude_client):
+            return
+
+        # Nombre local: el bucle corre en cada mensaje del chat
+        max_pending = MAX_PENDING_OUTPUT
+        # Sin copia: todo corre en el hilo del loop y nada dentro del bucle
+        # modifica self.clients (abort() solo programa connection_lost para
+        # después); las bajas las hace el handler de cada cliente
+        for client in self.clients:
             # Saltar el cliente a excluir
-            if exclude_client and client == exclude_client:
+            if client is exclude_client:
                 continue
 
             try:
-                # Verificar si el socket sigue válido
-                if client.fileno() == -1:  # Socket cerrado
-                    disconnected.append(client)
+                # Conexión cerrándose: su handler recibe EOF y la da de baja
+                # con unregister_client (aviso de salida y moderación incluidos)
+                if client.is_closing():
                     continue
 
-                client.send(formatted.encode('utf-8'))
-            except (BrokenPipeError, ConnectionResetError, OSError):
-                disconnected.append(client)
+                # write() never blocks: the transport buffers whatever the
+                # kernel doesn't take right away and sends it once the socket
+                # is writable again, so a slow peer never holds up the others
+                transport = client.transport
+                if transport.get_write_buffer_size() > max_pending:
+                    # The peer stopped reading; drop it rather than queue forever.
+                    # abort() skips the flush; the writer stays in self.clients
+                    # (skipped above while closing) until its handler sees EOF
+                    # and unregisters it
+                    info = self.client_info.get(client)
+                    print(f"[-] {info['nickname'] if info else 'Client'} is not reading, dropping connection")
+                    transport.abort()
+                    continue
+                client.write(frame)
             except Exception:
-                disconnected.append(client)
-
-        # Clean up disconnected clients
-        for client in disconnected:
-            if client in self.clients:
-                self.clients.remove(client)
-                if client in self.client_info:
-                    info = self.client_info[client]
-                    self.moderation.release_color(info["color"])
-                    del self.client_info[client]
-                    print(f"[-] {info['nickname']} removed during broadcast")
-
-    def send_private_message(self, sender_client: socket.socket,
+                # Drop the connection; its handler sees EOF and runs
+                # unregister_client (leave notice, color and mute release)
+                info = self.client_info.get(client)
+                print(f"[-] Send to {info['nickname'] if info else 'client'} failed, dropping connection")
+                client.transport.abort()
+
+    def send_private_message(self, sender_client: asyncio.StreamWriter,
                             sender: str, receiver: str,
                             message: str, sender_color: str):
-        """Send private message between users."""
-        receiver_client = None
-        for client, info in self.client_info.items():
-            if info["nickname"] == receiver:
-                receiver_client = client
-                break
+        """
+        Send private message between users.
+
+        Raises ValueError (before anything is sent) if the whisper does not
+        fit in one frame.
+        """
+        receiver_client = self.nickname_index.get(receiver)
 
         if not receiver_client:
-            sender_client.send(
-                format_system_message(f"User '{receiver}' is not connected").encode('utf-8')
+            sender_client.write(
+                encode_frame_bytes(format_system_message_bytes(f"User '{receiver}' is not connected"))
             )
             return
 
-        # Format and send messages
+        # Format and encode both sides first, so an oversized whisper reaches nobody
         sender_fmt, receiver_fmt = format_private_message(sender, receiver, message)
+        sender_frame = encode_frame(sender_fmt)
+        receiver_frame = encode_frame(receiver_fmt)
 
         try:
-            sender_client.send(sender_fmt.encode('utf-8'))
+            sender_client.write(sender_frame)
         except:
             pass
 
         try:
-            receiver_client.send(receiver_fmt.encode('utf-8'))
+            receiver_client.write(receiver_frame)
         except:
             pass
 
         # Add to history
         self.history.add(f"{sender} ⭢ {receiver}: {message}", "private")
-        print(f"[PRIVATE] {sender} ⭢ {receiver}: {message}")
+        logger.debug("[PRIVATE] %s ⭢ %s: %s", sender, receiver, message)
 
-    def cleanup(self):
-        """Clean up server resources."""
-        if self.is_shutting_down:
-            return
-
-        self.is_shutting_down = True
+    async def _close_connections(self):
+        """Notify and close every client, then stop listening."""
         print("[+] Shutting down server...")
 
-        # Notify all clients
-        for client in self.clients[:]:
+        # Notify all clients and close their connections; close() flushes
+        # what is still buffered before the connection goes down
+        clients = list(self.clients)
+        for client in clients:
             try:
-                client.send(format_system_message("Server is shutting down...").encode('utf-8'))
+                client.write(_SHUTDOWN_FRAME)
+                client.close()
             except:
                 pass
 
-        # Close all connections
-        for client in self.clients[:]:
+        # Wait a moment for the goodbyes to go out
+        if clients:
+            await asyncio.wait(
+                [asyncio.ensure_future(client.wait_closed()) for client in clients],
+                timeout=1
+            )
+
+        # Close server socket
+        if self.server:
             try:
-                client.close()
-            except:
-                pass
+                self.server.close()
+                print("[+] Server socket closed")
+            except Exception as e:
+                print(f"[-] Error closing server socket: {e}")
 
-        # Wait a moment
-        time.sleep(1)
+    def cleanup(self):
+        """Clean up server resources."""
+        if self.is_shutting_down:
+            return
+
+        self.is_shutting_down = True
 
         # Save history if requested
-        if self.history.entries:
-            print(f"\n[+] Chat history contains {len(self.history.entries)} messages")
+        if self.history.count:
+            print(f"\n[+] Chat history contains {self.history.count} messages")
             while True:
                 try:
-                    save = input("Do you want to save the conversation? (y/n): ").strip().lower()
+                    save = self._console_input("Do you want to save the conversation? (y/n): ").strip().lower()
                     if save in ['y', 'yes']:
                         self.history.save()
                         break
@@ -449,12 +664,6 @@ Server Commands:
                     print("\n[+] Saving cancelled")
                     break
 
-        # Close server socket
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-                print("[+] Server socket closed")
-            except Exception as e:
-                print(f"[-] Error closing server socket: {e}")
-
+        self.history.close()
+        self._stop_logging()
         print("[+] Server stopped successfully")